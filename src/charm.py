@@ -6,18 +6,40 @@
 
 Charm for deploying and managing OCI images and their database relations.
 """
+import functools
 import logging
-from io import StringIO
+import re
 import ops
 
 from charms.data_platform_libs.v0.data_interfaces import DatabaseCreatedEvent, DatabaseRequires
 from container_runner import ContainerRunner
-from dotenv import dotenv_values
 from ops.model import ActiveStatus, MaintenanceStatus
-from typing import Dict
+from typing import Dict, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Matches one KEY=VALUE assignment of the .env subset documented in the README: an optional
+# "export " prefix, and a single quoted, double quoted (may span lines) or bare value.
+# Comments after a bare value must be preceded by whitespace. There is no variable expansion.
+_ENV_RE = re.compile(
+    r"""
+    [ \t]*(?:export[ \t]+)?(?P<key>[^=\#\s'"]+)[ \t]*=[ \t]*
+    (?:
+        '(?P<single>[^']*)'[ \t]*(?:\#[^\r\n]*)?
+      | "(?P<double>(?:\\.|[^"\\])*)"[ \t]*(?:\#[^\r\n]*)?
+      | (?P<bare>(?!['"])[^\r\n]*?)(?:[ \t]+\#[^\r\n]*)?[ \t]*
+    )
+    \r?$
+    """,
+    re.VERBOSE | re.MULTILINE,
+)
+# Escape sequences decoded inside double quoted values.
+_ENV_ESCAPE_RE = re.compile(r'\\([nrt"\\])')
+_ENV_ESCAPES = {"n": "\n", "r": "\r", "t": "\t", '"': '"', "\\": "\\"}
+
+# Parsed .env resources, keyed by (path, mtime_ns, size) so a changed resource is reparsed.
+_ENV_CACHE: Dict[Tuple[str, int, int], Dict[str, str]] = {}
+
 # A config value can be none, but that only happens if you are requesting an undefined key.
 _ConfigValue = bool | int | float | str | None
 
@@ -46,22 +68,45 @@ def _cast_config_to_string(config_value: _ConfigValue) -> str:
         raise ValueError(f"Config value is not an int: {config_value}")
 
 
+def _parse_env(content: str) -> Dict[str, str]:
+    """Parse the assignments of a .env file, warning about any line that is not valid."""
+    env_vars: Dict[str, str] = {}
+    pos = 0
+    while pos < len(content):
+        line_end = content.find("\n", pos)
+        if line_end == -1:
+            line_end = len(content)
+        line = content[pos:line_end].strip()
+        if line and not line.startswith("#"):
+            match = _ENV_RE.match(content, pos)
+            if match:
+                if match.group("double") is not None:
+                    value = _ENV_ESCAPE_RE.sub(
+                        lambda m: _ENV_ESCAPES[m.group(1)], match.group("double")
+                    )
+                elif match.group("single") is not None:
+                    value = match.group("single")
+                else:
+                    value = match.group("bare")
+                env_vars[match.group("key")] = value
+                # A double quoted value may span lines, so continue after the end of the match.
+                line_end = content.find("\n", match.end())
+                if line_end == -1:
+                    line_end = len(content)
+            else:
+                # Only log the line number, as the content may be secret.
+                line_number = content.count("\n", 0, pos) + 1
+                logger.warning(f"Skipping invalid .env line {line_number}")
+        pos = line_end + 1
+    return env_vars
+
+
 class ContainerRunnerCharm(ops.CharmBase):
     """Main operator class for Container Runner charm."""
 
     def __init__(self, *args):
         super().__init__(*args)
 
-        container_image = _cast_config_to_string(self.config.get("container-image-uri"))
-        container_port = _cast_config_to_int(self.config.get("container-port"))
-        host_port = _cast_config_to_int(self.config.get("host-port"))
-        email = _cast_config_to_string(self.config.get("email"))
-        domain = _cast_config_to_string(self.config.get("domain"))
-
-        self._container_runner = ContainerRunner(
-            container_image, container_port, host_port, email, domain
-        )
-
         # Open ports for certbot
         self.unit.open_port(protocol="tcp", port=80)
         self.unit.open_port(protocol="tcp", port=443)
@@ -69,6 +114,10 @@ class ContainerRunnerCharm(ops.CharmBase):
         # Initialise the integration with PostgreSQL. Currently hardcoded to ratings
         # TODO: add database name as config, use that to tell if we expect a db + makes this generic
         self._database = DatabaseRequires(self, relation_name="database", database_name="ratings")
+        # Parsed secret env vars, keyed by secret ID, to avoid repeated get_secret calls.
+        self._secret_cache: Dict[str, Dict[str, str]] = {}
+        # Env vars for the managed container, loaded on first use by _get_env_vars.
+        self._env_vars: Optional[Dict[str, str]] = None
 
         # Observe common Juju events
         # TODO: Do we want to use all these hooks? Or would it be better to use just _on_config?
@@ -78,12 +127,6 @@ class ContainerRunnerCharm(ops.CharmBase):
         self.framework.observe(self.on.config_changed, self._on_config_changed)
         self.framework.observe(self._database.on.database_created, self._on_database_created)
 
-        # Attempt to load the env file
-        # Initialise to an empty dict as this is mutated over time as hooks are fired.
-        self._env_vars = {}
-
-        self._env_vars = self._load_env_file()
-
         # Track state of charm
         # TODO: remove (see above)
         database_available = self.model.get_relation("database") is not None
@@ -100,7 +143,7 @@ class ContainerRunnerCharm(ops.CharmBase):
         # TODO: hook into the event and log what actually changed based on the event.
         self.unit.status = ops.MaintenanceStatus("Attempting to update config")
         # Load env vars
-        self._env_vars = self._load_env_file()
+        env_vars = self._get_env_vars(reload=True)
         # Load ports from Charm config
         # TODO: write some tests to poke at what happens if we want to override / remove config
         container_image = _cast_config_to_string(self.config.get("container-image-uri"))
@@ -115,7 +158,7 @@ class ContainerRunnerCharm(ops.CharmBase):
             return
         try:
             logger.info("Updating and resuming snap service for Container Runner.")
-            self._container_runner.configure(self._env_vars)
+            self._container_runner.configure(env_vars)
             self.unit.open_port(protocol="tcp", port=host_port)
             self.unit.status = ops.ActiveStatus()
             logger.info("Container Runner service started successfully.")
@@ -123,22 +166,41 @@ class ContainerRunnerCharm(ops.CharmBase):
             logger.error(f"Failed to start Container Runner: {str(e)}")
             self.unit.status = ops.BlockedStatus(f"Failed to start Container Runner: {str(e)}")
 
-    def _load_env_file(self) -> Dict[str, str]:
-        """Attempt to load and validate the .env files from resources and secrets and append to the existing env_vars dict."""
+    @functools.cached_property
+    def _container_runner(self) -> ContainerRunner:
+        """Runner for the managed container, constructed from charm config on first use."""
+        container_image = _cast_config_to_string(self.config.get("container-image-uri"))
+        container_port = _cast_config_to_int(self.config.get("container-port"))
+        host_port = _cast_config_to_int(self.config.get("host-port"))
+        email = _cast_config_to_string(self.config.get("email"))
+        domain = _cast_config_to_string(self.config.get("domain"))
+
+        return ContainerRunner(container_image, container_port, host_port, email, domain)
+
+    def _get_env_vars(self, reload: bool = False) -> Dict[str, str]:
+        """Get the env vars for the managed container, loading them on first use.
+
+        With reload set, loaded env vars are extended so values such as the db URI are kept.
+        """
+        if self._env_vars is None:
+            self._env_vars = self._load_env_file({})
+        elif reload:
+            self._env_vars = self._load_env_file(self._env_vars)
+        return self._env_vars
+
+    def _load_env_file(self, env_vars: Dict[str, str]) -> Dict[str, str]:
+        """Attempt to load and validate the .env files from resources and secrets and append to the given env_vars dict."""
         env_file_path = None
-        env_vars = self._env_vars
 
         # Load env vars from Juju resource
         try:
             # Get .env file
             env_file_path = self.model.resources.fetch("env-file")
-            # Filter out environment variables with values set to None (see dotenv_values docs for why).
-            filtered_env_vars: Dict[str, str] = {
-                key: value
-                for key, value in dotenv_values(env_file_path).items()
-                if value is not None
-            }
-            env_vars.update(filtered_env_vars)
+            st = env_file_path.stat()
+            cache_key = (str(env_file_path), st.st_mtime_ns, st.st_size)
+            if cache_key not in _ENV_CACHE:
+                _ENV_CACHE[cache_key] = _parse_env(env_file_path.read_text(encoding="utf-8"))
+            env_vars.update(_ENV_CACHE[cache_key])
             if not env_vars:
                 raise ValueError("The .env file is empty or has invalid formatting.")
             logging.info(".env file loaded successfully.")
@@ -165,7 +227,7 @@ class ContainerRunnerCharm(ops.CharmBase):
 
         try:
             logger.info("Updating and resuming snap service for Container Runner.")
-            self._container_runner.configure(self._env_vars)
+            self._container_runner.configure(self._get_env_vars())
             # self.unit.open_port(protocol="tcp", port=PORT)
             self.unit.status = ops.ActiveStatus()
             logger.info("Container Runner started successfully.")
@@ -190,16 +252,16 @@ class ContainerRunnerCharm(ops.CharmBase):
 
     def _get_secret_content(self, secret_id) -> Dict[str, str]:
         """Get the content of a Juju secret."""
+        # Cached per charm instance, so get_content(refresh=True) only runs on the first call
+        # for a secret within a hook.
+        if secret_id in self._secret_cache:
+            return self._secret_cache[secret_id]
         try:
             secret = self.model.get_secret(id=secret_id)
             env_var_buffer = secret.get_content(refresh=True)["env-vars"]
-            # Filter out environment variables with values set to None (see dotenv_values docs for why).
-            filtered_secret_env_vars: Dict[str, str] = {
-                key: value
-                for key, value in dotenv_values(stream=StringIO(env_var_buffer)).items()
-                if value is not None
-            }
-            return filtered_secret_env_vars
+            secret_env_vars = _parse_env(env_var_buffer)
+            self._secret_cache[secret_id] = secret_env_vars
+            return secret_env_vars
         except ops.SecretNotFoundError:
             logger.error(f"secret {secret_id!r} not found.")
             raise
@@ -214,23 +276,26 @@ class ContainerRunnerCharm(ops.CharmBase):
         # TODO: if a db is related, and the charm crashed, is the database_created event fired off again?
         # TODO: Move this to a separate field and not shared with env_vars so we can wipe env_vars each time and preserve the connection string.
         logger.info("Updating config and resterting Container Runner.")
-        if self.model.get_relation("database") is None:
+        relation = self.model.get_relation("database")
+        if relation is None:
             logger.warning("No database relation found. Waiting.")
             self.unit.status = ops.WaitingStatus("Waiting for database relation")
             return
 
         self.unit.status = ops.MaintenanceStatus("Attempting to update Container Runner config.")
-        # Get connection string from Juju relation to db
-        connection_string = self._db_connection_string()
+        # Get connection string from a single snapshot of the Juju relation to db
+        data = self._database.fetch_relation_data().get(relation.id, {})
+        connection_string = self._format_db_connection_string(data)
 
-        self._env_vars.update({"APP_POSTGRES_URI": connection_string})
+        env_vars = self._get_env_vars()
+        env_vars.update({"APP_POSTGRES_URI": connection_string})
         self._waiting_for_database_relation = False
         logger.debug(
             f"_waiting_for_database_relation updated to {self._waiting_for_database_relation}"
         )
 
         try:
-            self._container_runner.configure(self._env_vars)
+            self._container_runner.configure(env_vars)
         except Exception as e:
             self.unit.status = ops.BlockedStatus(
                 f"Failed to start configure container runner: {str(e)}"
@@ -238,17 +303,11 @@ class ContainerRunnerCharm(ops.CharmBase):
         self.unit.open_port(protocol="tcp", port=_cast_config_to_int(self.config.get("host-port")))
         self.unit.status = ActiveStatus()
 
-    def _db_connection_string(self) -> str:
-        """Report database connection string using info from relation databag."""
+    def _format_db_connection_string(self, data: Dict[str, str]) -> str:
+        """Build the database connection string from already fetched relation data."""
         logger.info("Attempting to generate database connection string.")
 
-        relation = self.model.get_relation("database")
-
-        if not relation:
-            logger.warning("Database relation not found. Returning empty connection string.")
-            return ""
         # TODO: Assumes this is a psql db, should be more generic in the future.
-        data = self._database.fetch_relation_data()[relation.id]
         username = data.get("username")
         password = data.get("password")
         endpoints = data.get("endpoints")
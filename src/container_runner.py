@@ -18,6 +18,9 @@ logger.setLevel(log_level)
 
 DOCKER_DAEMON_CONFIG_PATH = Path("/etc/docker/daemon.json")
 
+# Juju proxy settings do not change during a hook, so they only need applying once per process.
+_proxy_settings_applied = False
+
 
 def _obtain_tls(email: str, domain: str):
     # Install Certbot for managing certificates
@@ -52,11 +55,16 @@ def _obtain_tls(email: str, domain: str):
 
 def _try_set_proxy_settings():
     """If Juju proxy environment variables are present, set proxy environment variables and write Docker proxy settings to /etc/docker/daemon.json."""
+    global _proxy_settings_applied
+    if _proxy_settings_applied:
+        return
+
     http_proxy = os.environ.get("JUJU_CHARM_HTTP_PROXY")
     https_proxy = os.environ.get("JUJU_CHARM_HTTPS_PROXY")
 
     if not http_proxy and not https_proxy:
         logger.info("No Juju proxy environment variables set, skipping setting proxy settings")
+        _proxy_settings_applied = True
         return
 
     # Proxy settings to be written to /etc/docker/daemon.json for Docker daemon to load.
@@ -78,6 +86,7 @@ def _try_set_proxy_settings():
     daemon_config = {"proxies": proxy_config}
     DOCKER_DAEMON_CONFIG_PATH.parent.mkdir(parents=True, exist_ok=True)
     DOCKER_DAEMON_CONFIG_PATH.write_text(json.dumps(daemon_config, indent=2), encoding="utf-8")
+    _proxy_settings_applied = True
 
 
 class _Docker:
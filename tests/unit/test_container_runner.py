@@ -4,6 +4,7 @@ import json
 from container_runner import _Docker, ContainerRunner, _try_set_proxy_settings
 from unittest import mock
 import subprocess
+import container_runner
 
 
 class TestDocker(unittest.TestCase):
@@ -650,6 +651,34 @@ class TestContainerRunner(unittest.TestCase):
                 # Reset mock for the next test case
                 _mock_run_command.reset_mock()
 
+    @mock.patch("container_runner._proxy_settings_applied", False)
+    @mock.patch("pathlib.Path.write_text")
+    @mock.patch("pathlib.Path.mkdir")
+    def test_try_set_proxy_settings_applied_once(self, mock_mkdir, mock_write_text):
+        env_vars = {"JUJU_CHARM_HTTP_PROXY": "http://proxy.example.com:8080"}
+        with mock.patch.dict(os.environ, env_vars, clear=True):
+            _try_set_proxy_settings()
+            _try_set_proxy_settings()
+
+        mock_mkdir.assert_called_once_with(parents=True, exist_ok=True)
+        mock_write_text.assert_called_once()
+
+    @mock.patch("container_runner._proxy_settings_applied", False)
+    @mock.patch("pathlib.Path.write_text")
+    @mock.patch("pathlib.Path.mkdir")
+    def test_try_set_proxy_settings_retried_after_failure(self, mock_mkdir, mock_write_text):
+        env_vars = {"JUJU_CHARM_HTTP_PROXY": "http://proxy.example.com:8080"}
+        mock_write_text.side_effect = [PermissionError("denied"), None]
+        with mock.patch.dict(os.environ, env_vars, clear=True):
+            with self.assertRaises(PermissionError):
+                _try_set_proxy_settings()
+            self.assertFalse(container_runner._proxy_settings_applied)
+
+            _try_set_proxy_settings()
+
+        self.assertEqual(mock_write_text.call_count, 2)
+        self.assertTrue(container_runner._proxy_settings_applied)
+
 
 @mock.patch("pathlib.Path.write_text")
 @mock.patch("pathlib.Path.mkdir")
@@ -704,7 +733,9 @@ def test_try_set_proxy_settings(self, mock_mkdir, mock_write_text):
             mock_write_text.reset_mock()
 
             # Run the test case
-            with mock.patch.dict(os.environ, env_vars, clear=True):
+            with mock.patch.dict(os.environ, env_vars, clear=True), mock.patch(
+                "container_runner._proxy_settings_applied", False
+            ):
 
                 # Call the method
                 _try_set_proxy_settings()